@@ -1,7 +1,8 @@
 # crypto_app.py (Main Landing Page)
 
 import streamlit as st
-import shutil
+
+import tools_check
 
 # --- Configuration ---
 ENCRYPTION_CIPHER = "aes-256-cbc" # From Encrypt/Decrypt Tool
@@ -11,40 +12,25 @@ ZIP_COMMAND = "zip" # From Zip Tool
 # --- Helper Functions ---
 def check_commands():
     """Checks if required commands (openssl, zip) are available."""
-    missing = []
-    if shutil.which(OPENSSL_COMMAND) is None:
-        missing.append(OPENSSL_COMMAND)
-    if shutil.which(ZIP_COMMAND) is None:
-        missing.append(ZIP_COMMAND)
-    return missing
-
-# --- Page Configuration (Must be the first Streamlit command) ---
-st.set_page_config(
-    page_title="Crypto App Home",
-    page_icon="🛡️", # Changed icon to something more general/secure
-    layout="centered"
-)
+    return tools_check.missing((OPENSSL_COMMAND, ZIP_COMMAND))
 
-# --- Landing Page Content ---
-
-st.title("🛡️ Welcome to the Cryptography & File Utilities Application") # More general title
-
-st.markdown("---")
-
-st.header("About This App")
-st.markdown(f"""
+@st.cache_data
+def about_markdown(cipher):
+    """Builds the static About block once; reruns reuse the cached string."""
+    return f"""
 This application provides user-friendly tools for common file security and manipulation tasks,
-leveraging standard command-line utilities like **OpenSSL** and **Zip**.
+running the cryptography in-process (the **OpenSSL** and **Zip** command-line utilities serve
+only as fallbacks).
 
 **Available Tools (Select from Sidebar):**
 
 1.  **Encrypt Decrypt Tool:**
-    *   Uses OpenSSL's `{ENCRYPTION_CIPHER}` cipher with PBKDF2 for strong file encryption/decryption.
+    *   Encrypts with authenticated AES-256-GCM by default; `{cipher}` remains available for OpenSSL-compatible output. Keys are derived with PBKDF2.
     *   Ideal for securing individual files with a password.
 
 2.  **Zip File Tool:**
-    *   Creates password-protected ZIP archives using the system's `zip` command (`-e` flag).
-    *   Suitable for bundling and protecting files with standard ZIP encryption. *(Note: Standard ZIP encryption is generally considered less secure than AES used in the Encrypt/Decrypt tool)*.
+    *   Creates password-protected ZIP archives with WinZip-style AES-256 encryption (in-process, no external `zip` needed).
+    *   Suitable for bundling and protecting multiple files. *(Note: archives need an AES-capable extractor such as 7-Zip or WinZip; the legacy system `zip` is used only as a fallback)*.
 
 **General Features:**
 *   Easy file selection via browsing or drag-and-drop.
@@ -56,32 +42,55 @@ leveraging standard command-line utilities like **OpenSSL** and **Zip**.
 *   Ensure you are using these tools responsibly and ethically.
 *   **Crucially, remember your passwords!** There is no way to recover a file if the password is lost for either encryption or ZIP protection.
 *   Encryption compatibility is highest for files encrypted and decrypted using the Encrypt/Decrypt tool or the exact same OpenSSL parameters.
-*   The ZIP tool relies on standard `zip` encryption, which may have compatibility variations and is less robust than modern AES encryption.
-*   **Security Note:** For automation, both tools pass passwords non-interactively to their respective command-line utilities. This might expose the password temporarily in the system's process list. Use with caution in shared or untrusted environments.
-""")
+*   **Security Note:** Passwords stay in-process when the preferred backends are installed; only the legacy command-line fallbacks pass them to external utilities (which may expose them briefly in the process list).
+"""
+
+@st.cache_data
+def missing_commands_markdown():
+    """Builds the static install-help block shown when fallback commands are missing."""
+    return """
+        The tools run in-process by default (via the `cryptography` and `pyzipper` packages);
+        the command-line utilities are only needed as fallbacks when those packages are
+        unavailable. To install the missing fallbacks:
+
+        *   **OpenSSL:** Usually available on macOS/Linux. Install via package manager (`apt`, `yum`, `brew`) or from [OpenSSL website](https://www.openssl.org/).
+        *   **Zip:** Usually available on macOS/Linux. Install via package manager if missing (e.g., `sudo apt install zip`, `sudo yum install zip`).
+    """
+
+# --- Page Configuration (Must be the first Streamlit command) ---
+st.set_page_config(
+    page_title="Crypto App Home",
+    page_icon="🛡️", # Changed icon to something more general/secure
+    layout="centered"
+)
+
+# --- Landing Page Content ---
+
+st.title("🛡️ Welcome to the Cryptography & File Utilities Application") # More general title
 
 st.markdown("---")
 
-# Check for Required Commands and display status
-st.subheader("System Check")
-missing_commands = check_commands()
+@st.fragment
+def about_section():
+    """Static About block plus System Check, isolated in a fragment so
+    widget interactions elsewhere don't re-execute it."""
+    st.header("About This App")
+    st.markdown(about_markdown(ENCRYPTION_CIPHER))
 
-if not missing_commands:
-    st.success(f"✅ Required commands ('{OPENSSL_COMMAND}', '{ZIP_COMMAND}') found!")
-    st.info("Navigate to the desired tool page using the sidebar on the left to begin.")
-else:
-    st.error(f"❌ Critical Error: The following command(s) were not found: `{'`, `'.join(missing_commands)}`")
-    st.markdown(f"""
-        Please ensure the missing command-line utilities are installed on the system running this Streamlit app
-        and are accessible in the system's PATH.
+    st.markdown("---")
 
-        *   **OpenSSL:** Usually available on macOS/Linux. Install via package manager (`apt`, `yum`, `brew`) or from [OpenSSL website](https://www.openssl.org/).
-        *   **Zip:** Usually available on macOS/Linux. Install via package manager if missing (e.g., `sudo apt install zip`, `sudo yum install zip`).
+    # Check for Required Commands and display status
+    st.subheader("System Check")
+    missing_commands = check_commands()
+
+    if not missing_commands:
+        st.success(f"✅ Command-line fallbacks ('{OPENSSL_COMMAND}', '{ZIP_COMMAND}') found!")
+        st.info("Navigate to the desired tool page using the sidebar on the left to begin.")
+    else:
+        st.warning(f"⚠️ Fallback command(s) not found: `{'`, `'.join(missing_commands)}` — only needed if the in-process backends are unavailable.")
+        st.markdown(missing_commands_markdown())
 
-        The application may not function correctly until these are installed.
-    """)
-    # Allow navigation but show the error prominently
-    # st.stop() # Removing stop so users can still see the app structure
+about_section()
 
 st.markdown("---")
 st.markdown("Developed with Streamlit.")
@@ -1,57 +1,284 @@
 import streamlit as st
+import atexit
+import collections
+import functools
+import hashlib
+import hmac
+import io
 import subprocess
 import os
 import tempfile
 import shutil
 import mimetypes # To guess file types for preview
+import selectors
+import time
+
+import numpy as np
+
+import tools_check
+
+# Preferred: run the cipher in-process via the cryptography package (OpenSSL's
+# EVP layer under the hood, so AES-NI is used automatically). Falls back to
+# the openssl CLI only when cryptography isn't installed.
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    HAVE_CRYPTOGRAPHY = True
+except ImportError:
+    HAVE_CRYPTOGRAPHY = False
 
 # --- Configuration ---
 OPENSSL_COMMAND = "openssl"
+OPENSSL_TIMEOUT = 60 # Seconds before a fallback openssl run is killed
 ENCRYPTION_CIPHER = "aes-256-cbc"
+OPENSSL_MAGIC = b"Salted__" # openssl enc header: magic + 8-byte salt
+# Our GCM container: magic + 4-byte big-endian PBKDF2 iteration count +
+# 8-byte salt + 12-byte nonce + ciphertext + 16-byte tag. GCM pipelines
+# across AES-NI blocks (CBC encryption is serial) and authenticates the
+# ciphertext, so it's the default for new encryptions.
+GCM_MAGIC = b"GCMSalt_"
+GCM_HEADER_LEN = len(GCM_MAGIC) + 4 + 8 + 12
+GCM_TAG_LEN = 16
+# CTR container: magic + 4-byte iteration count + 8-byte salt + 16-byte
+# nonce + ciphertext. Like GCM it pipelines across AES-NI blocks, but
+# carries no authentication tag.
+CTR_MAGIC = b"CTRSalt_"
+CTR_HEADER_LEN = len(CTR_MAGIC) + 4 + 8 + 16
+PBKDF2_ITERATIONS = 10000 # openssl enc -pbkdf2 default; CBC-compat format only
+PBKDF2_ITERATIONS_NEW = 600000 # modern work factor for the GCM/CTR containers
+# Sanity bounds when reading the count back from a header
+PBKDF2_ITERATIONS_MIN = 1000
+PBKDF2_ITERATIONS_MAX = 10_000_000
 PREVIEW_SIZE_LIMIT = 5 * 1024 * 1024 # Limit preview size to 5MB to avoid browser slowdown
 PREVIEW_LINES_LIMIT = 100 # Max lines for text preview
+PREVIEW_HEX_BYTES = 256 # Bytes shown in the binary hex preview
+
+# Two-char lookup table: one vectorized index replaces a per-byte Python
+# loop if larger hex previews are ever enabled.
+HEX_TABLE = np.array([f'{i:02x}' for i in range(256)], dtype='U2')
 
 # --- Helper Functions ---
 
+def _remove_quietly(path):
+    """Best-effort removal of a spill file (used for atexit cleanup)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+@functools.lru_cache(maxsize=64)
+def guess_mime(filename):
+    """
+    Memoized mimetypes lookup; the first call loads the system mime DB and
+    reruns skip both that and the per-name guess.
+    """
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+@functools.lru_cache(maxsize=16)
+def derive_key(password: bytes, salt: bytes, iterations: int, dklen: int) -> bytes:
+    """
+    Derives key material with PBKDF2-HMAC-SHA256, cached per (password, salt)
+    so repeated operations pay the expensive KDF only once. A small
+    bounded lru_cache keeps the derived keys out of Streamlit's global
+    cache storage. Matches what `openssl enc -pbkdf2` derives (for
+    aes-256-cbc: 48 bytes, a 32-byte key followed by a 16-byte IV).
+    """
+    return hashlib.pbkdf2_hmac('sha256', password, salt, iterations, dklen)
+
+def encrypt_file(input_path, output_path, password):
+    """
+    Encrypts in-process, byte-compatible with
+    `openssl enc -aes-256-cbc -pbkdf2` (Salted__ magic + 8-byte salt header),
+    streaming the file in 1 MiB chunks.
+    """
+    salt = os.urandom(8)
+    key_iv = derive_key(password.encode(), salt, PBKDF2_ITERATIONS, 48)
+    encryptor = Cipher(algorithms.AES(key_iv[:32]),
+                       modes.CBC(key_iv[32:])).encryptor()
+    padder = padding.PKCS7(128).padder()
+    with open(input_path, 'rb') as src, open(output_path, 'wb') as dst:
+        dst.write(OPENSSL_MAGIC + salt)
+        while chunk := src.read(1024 * 1024):
+            dst.write(encryptor.update(padder.update(chunk)))
+        dst.write(encryptor.update(padder.finalize()) + encryptor.finalize())
+
+def decrypt_file(input_path, output_path, password):
+    """
+    Decrypts openssl-enc-format (`Salted__`) files in-process, streaming in
+    1 MiB chunks. Raises ValueError on a malformed header or bad padding
+    (the usual symptom of a wrong password).
+    """
+    with open(input_path, 'rb') as src:
+        header = src.read(16)
+        if len(header) < 16 or not header.startswith(OPENSSL_MAGIC):
+            raise ValueError("Input does not look like an OpenSSL-encrypted file (missing 'Salted__' header).")
+        salt = header[8:16]
+        key_iv = derive_key(password.encode(), salt, PBKDF2_ITERATIONS, 48)
+        decryptor = Cipher(algorithms.AES(key_iv[:32]),
+                           modes.CBC(key_iv[32:])).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        with open(output_path, 'wb') as dst:
+            while chunk := src.read(1024 * 1024):
+                dst.write(unpadder.update(decryptor.update(chunk)))
+            try:
+                dst.write(unpadder.update(decryptor.finalize()) + unpadder.finalize())
+            except ValueError:
+                raise ValueError("Bad decrypt: incorrect password or corrupted file.")
+
+def encrypt_file_gcm(input_path, output_path, password):
+    """
+    Encrypts with AES-256-GCM (authenticated, and parallelizable across
+    AES-NI blocks unlike CBC), streaming in 1 MiB chunks. See GCM_MAGIC
+    for the container layout.
+    """
+    salt = os.urandom(8)
+    nonce = os.urandom(12)
+    key = derive_key(password.encode(), salt, PBKDF2_ITERATIONS_NEW, 32)
+    encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+    with open(input_path, 'rb') as src, open(output_path, 'wb') as dst:
+        dst.write(GCM_MAGIC + PBKDF2_ITERATIONS_NEW.to_bytes(4, 'big')
+                  + salt + nonce)
+        while chunk := src.read(1024 * 1024):
+            dst.write(encryptor.update(chunk))
+        encryptor.finalize()
+        dst.write(encryptor.tag)
+
+def decrypt_file_gcm(input_path, output_path, password):
+    """
+    Decrypts the GCM container, streaming in 1 MiB chunks. Raises
+    ValueError on a malformed header or failed authentication (wrong
+    password or tampered ciphertext).
+    """
+    size = os.path.getsize(input_path)
+    if size < GCM_HEADER_LEN + GCM_TAG_LEN:
+        raise ValueError("Input is too short to be a valid GCM-encrypted file.")
+    with open(input_path, 'rb') as src:
+        header = src.read(GCM_HEADER_LEN)
+        if not header.startswith(GCM_MAGIC):
+            raise ValueError("Input does not look like a GCM-encrypted file.")
+        iterations = int.from_bytes(header[8:12], 'big')
+        if not PBKDF2_ITERATIONS_MIN <= iterations <= PBKDF2_ITERATIONS_MAX:
+            raise ValueError("Input header carries an unreasonable PBKDF2 iteration count.")
+        salt = header[12:20]
+        nonce = header[20:32]
+        # The tag sits at the end of the file; fetch it first so the
+        # decryptor can authenticate during finalize.
+        src.seek(size - GCM_TAG_LEN)
+        tag = src.read(GCM_TAG_LEN)
+        src.seek(GCM_HEADER_LEN)
+        key = derive_key(password.encode(), salt, iterations, 32)
+        decryptor = Cipher(algorithms.AES(key),
+                           modes.GCM(nonce, tag)).decryptor()
+        remaining = size - GCM_HEADER_LEN - GCM_TAG_LEN
+        with open(output_path, 'wb') as dst:
+            while remaining > 0:
+                chunk = src.read(min(1024 * 1024, remaining))
+                remaining -= len(chunk)
+                dst.write(decryptor.update(chunk))
+            try:
+                dst.write(decryptor.finalize())
+            except InvalidTag:
+                raise ValueError("Authentication failed: incorrect password or tampered file.")
+
+def encrypt_file_ctr(input_path, output_path, password):
+    """
+    Encrypts with AES-256-CTR, streaming in 1 MiB chunks. As fast as GCM
+    but unauthenticated: a wrong password on decrypt yields garbage
+    rather than an error. See CTR_MAGIC for the container layout.
+    """
+    salt = os.urandom(8)
+    nonce = os.urandom(16)
+    key = derive_key(password.encode(), salt, PBKDF2_ITERATIONS_NEW, 32)
+    encryptor = Cipher(algorithms.AES(key), modes.CTR(nonce)).encryptor()
+    with open(input_path, 'rb') as src, open(output_path, 'wb') as dst:
+        dst.write(CTR_MAGIC + PBKDF2_ITERATIONS_NEW.to_bytes(4, 'big')
+                  + salt + nonce)
+        while chunk := src.read(1024 * 1024):
+            dst.write(encryptor.update(chunk))
+        dst.write(encryptor.finalize())
+
+def decrypt_file_ctr(input_path, output_path, password):
+    """
+    Decrypts the CTR container, streaming in 1 MiB chunks. Raises
+    ValueError on a malformed header; note there is no authentication.
+    """
+    with open(input_path, 'rb') as src:
+        header = src.read(CTR_HEADER_LEN)
+        if len(header) < CTR_HEADER_LEN or not header.startswith(CTR_MAGIC):
+            raise ValueError("Input does not look like a CTR-encrypted file.")
+        iterations = int.from_bytes(header[8:12], 'big')
+        if not PBKDF2_ITERATIONS_MIN <= iterations <= PBKDF2_ITERATIONS_MAX:
+            raise ValueError("Input header carries an unreasonable PBKDF2 iteration count.")
+        salt = header[12:20]
+        nonce = header[20:36]
+        key = derive_key(password.encode(), salt, iterations, 32)
+        decryptor = Cipher(algorithms.AES(key), modes.CTR(nonce)).decryptor()
+        with open(output_path, 'wb') as dst:
+            while chunk := src.read(1024 * 1024):
+                dst.write(decryptor.update(chunk))
+            dst.write(decryptor.finalize())
+
 def check_openssl():
     """Checks if the openssl command is available in the system PATH."""
-    if shutil.which(OPENSSL_COMMAND) is None:
+    if tools_check.which(OPENSSL_COMMAND) is None:
         st.error(f"CRITICAL ERROR: '{OPENSSL_COMMAND}' command not found. Please ensure OpenSSL is installed and in the system PATH.")
         st.stop()
 
 def run_openssl_command(args, password):
     """
     Runs the openssl command with given arguments and password.
-    Returns tuple: (success_boolean, stdout_str, stderr_str)
+    Returns tuple: (success_boolean, stdout_str, stderr_str); stdout is
+    always empty since it is discarded at the fd level.
     """
     command = [OPENSSL_COMMAND] + args
     # Use -pass pass:PASSWORD for non-interactive password input
     # SECURITY WARNING: Passing password on command line can be a risk in multi-user systems.
     command.extend(['-pass', f'pass:{password}'])
 
-    printable_command = [arg if not arg.startswith('pass:') else 'pass:********' for arg in command]
-    #st.write(f"DEBUG: Running command: `{' '.join(printable_command)}`") # For debugging
-
     try:
-        # Use a timeout to prevent hangs (e.g., if openssl waits unexpectedly)
-        process = subprocess.run(
+        # stdin and stdout are closed off at the fd level (nothing is ever
+        # written to or read from them, and a prompting tool must not wait
+        # on input); stderr is drained under a hard deadline so a child
+        # that hangs with the pipe open can't wedge the worker.
+        process = subprocess.Popen(
             command,
-            check=False, # Don't raise exception on non-zero exit, we check manually
-            capture_output=True,
-            text=True,
-            timeout=60 # Timeout in seconds
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
         )
-        success = process.returncode == 0
+        stderr_tail = collections.deque(maxlen=64)
+        deadline = time.monotonic() + OPENSSL_TIMEOUT
+        try:
+            with process.stderr, selectors.DefaultSelector() as selector:
+                selector.register(process.stderr, selectors.EVENT_READ)
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(command, OPENSSL_TIMEOUT)
+                    if selector.select(remaining):
+                        data = os.read(process.stderr.fileno(), 65536)
+                        if not data:
+                            break
+                        stderr_tail.append(data)
+            returncode = process.wait(
+                timeout=max(deadline - time.monotonic(), 1.0))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise
+        stderr_str = b''.join(stderr_tail).decode('utf-8', 'replace').strip()
+        success = returncode == 0
         if not success:
-            st.error(f"OpenSSL Error (Exit Code {process.returncode}):\n```\n{process.stderr.strip()}\n```")
+            st.error(f"OpenSSL Error (Exit Code {returncode}):\n```\n{stderr_str}\n```")
         # Also print stderr if openssl succeeded but printed warnings
-        elif process.stderr:
-             st.warning(f"OpenSSL Messages (stderr):\n```\n{process.stderr.strip()}\n```")
+        elif stderr_str:
+             st.warning(f"OpenSSL Messages (stderr):\n```\n{stderr_str}\n```")
 
-        return success, process.stdout.strip(), process.stderr.strip()
+        return success, "", stderr_str
 
     except subprocess.TimeoutExpired:
-        st.error("OpenSSL command timed out after 60 seconds.")
+        st.error(f"OpenSSL command timed out after {OPENSSL_TIMEOUT} seconds.")
         return False, "", "Timeout expired"
     except FileNotFoundError:
          st.error(f"Error: The '{OPENSSL_COMMAND}' command was not found. Is OpenSSL installed and in PATH?")
@@ -61,38 +288,80 @@ def run_openssl_command(args, password):
         return False, "", str(e)
 
 
-def get_file_preview(file_path):
-    """Generates a preview string for a file, handling text and binary."""
+def get_file_preview_bytes(content_bytes, file_size, filename):
+    """Generates a preview string from a file's head bytes, handling text and binary."""
     try:
-        file_size = os.path.getsize(file_path)
         if file_size == 0:
             return "(File is empty)"
         if file_size > PREVIEW_SIZE_LIMIT:
             return f"(File is too large for preview: {file_size / (1024*1024):.2f} MB)"
 
         # Guess mime type
-        mime_type, _ = mimetypes.guess_type(file_path)
-        is_likely_text = mime_type and mime_type.startswith('text')
-
-        with open(file_path, 'rb') as f:
-            content_bytes = f.read(PREVIEW_SIZE_LIMIT) # Read up to limit
+        is_likely_text = guess_mime(filename).startswith('text')
 
         if is_likely_text:
+            # Stop reading after the line limit instead of decoding and
+            # splitting the whole head just to discard most of it.
+            buf = io.BytesIO(content_bytes)
+            lines = []
+            for _ in range(PREVIEW_LINES_LIMIT):
+                line = buf.readline()
+                if not line:
+                    break
+                lines.append(line)
+            truncated = bool(buf.read(1))
             try:
-                content_str = content_bytes.decode('utf-8')
-                lines = content_str.splitlines()
-                if len(lines) > PREVIEW_LINES_LIMIT:
-                     preview_content = "\n".join(lines[:PREVIEW_LINES_LIMIT]) + "\n... (truncated)"
-                else:
-                     preview_content = content_str
+                preview_content = b''.join(lines).decode('utf-8').rstrip('\n')
+                if truncated:
+                    preview_content += "\n... (truncated)"
                 return f"**Preview (first {PREVIEW_LINES_LIMIT} lines or {PREVIEW_SIZE_LIMIT/1024:.0f}KB):**\n```\n{preview_content}\n```"
             except UnicodeDecodeError:
                 is_likely_text = False # Decoding failed, treat as binary
 
         # If not text or decoding failed
-        hex_preview = content_bytes[:256].hex(' ') # Show first 256 bytes as hex
-        return f"(Binary file detected or Text decoding failed)\n**Hex Preview (first 256 bytes):**\n```\n{hex_preview}\n...```"
+        head = np.frombuffer(content_bytes[:PREVIEW_HEX_BYTES], dtype=np.uint8)
+        hex_preview = ' '.join(HEX_TABLE[head])
+        return f"(Binary file detected or Text decoding failed)\n**Hex Preview (first {PREVIEW_HEX_BYTES} bytes):**\n```\n{hex_preview}\n...```"
+
+    except Exception as e:
+        return f"(Error generating preview: {e})"
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_upload_preview(cache_key, _uploaded_file):
+    """
+    Preview for an upload, cached on a cheap key (blake2b of the first
+    64 KiB plus size/name) so reruns skip even the head read. The upload
+    itself is underscore-prefixed to keep Streamlit from hashing 5 MB of
+    content per rerun.
+    """
+    _uploaded_file.seek(0)
+    head_bytes = _uploaded_file.read(PREVIEW_SIZE_LIMIT)
+    _uploaded_file.seek(0)
+    return get_file_preview_bytes(head_bytes, _uploaded_file.size,
+                                  _uploaded_file.name)
+
+def upload_preview_key(uploaded_file):
+    """Builds the cheap cache key for cached_upload_preview."""
+    uploaded_file.seek(0)
+    probe = uploaded_file.read(65536)
+    uploaded_file.seek(0)
+    return hashlib.blake2b(
+        probe + uploaded_file.size.to_bytes(8, 'little')
+        + uploaded_file.name.encode(),
+        digest_size=16).digest()
+
+def get_file_preview(file_path, display_name=None):
+    """
+    Generates a preview string for a file on disk. The mime guess uses
+    display_name when given, for spill files whose on-disk name (e.g.
+    something.out) differs from the user-facing one.
+    """
+    try:
+        file_size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            content_bytes = f.read(PREVIEW_SIZE_LIMIT) # Read up to limit
+        return get_file_preview_bytes(content_bytes, file_size,
+                                      display_name or file_path)
     except Exception as e:
         return f"(Error generating preview: {e})"
 
@@ -104,14 +373,25 @@ st.set_page_config(
 )
 
 st.title("🔑 Encrypt / Decrypt File")
-st.markdown(f"Uses `openssl {ENCRYPTION_CIPHER} -pbkdf2`. Remember your password!")
-
-# --- Check OpenSSL availability ---
-check_openssl()
+if HAVE_CRYPTOGRAPHY:
+    st.markdown(f"Encrypts in-process with authenticated AES-256-GCM by default; pick CBC in the sidebar for `openssl {ENCRYPTION_CIPHER}`-compatible output. Remember your password!")
+else:
+    st.markdown(f"Uses `openssl {ENCRYPTION_CIPHER} -pbkdf2`. Remember your password!")
+    # --- Check OpenSSL availability (fallback path only) ---
+    check_openssl()
 
 # --- Session State Initialization ---
-if 'output_content' not in st.session_state:
-    st.session_state.output_content = None
+# Path of the output spill file, not the output bytes
+if 'output_path' not in st.session_state:
+    st.session_state.output_path = None
+# Rendered output preview, generated once per operation
+if 'output_preview' not in st.session_state:
+    st.session_state.output_preview = None
+# Session-scoped workspace, reused across operations instead of a fresh
+# mkdtemp/rmtree round-trip per run
+if 'workdir' not in st.session_state:
+    st.session_state.workdir = tempfile.mkdtemp(prefix='fileutil_')
+    atexit.register(shutil.rmtree, st.session_state.workdir, ignore_errors=True)
 if 'output_filename' not in st.session_state:
     st.session_state.output_filename = None
 if 'operation_status' not in st.session_state:
@@ -120,6 +400,21 @@ if 'operation_status' not in st.session_state:
 # --- UI Elements ---
 operation = st.radio("Select Operation:", ("Encrypt", "Decrypt"), horizontal=True)
 
+# Cipher choice for new encryptions; decryption auto-detects the format.
+CIPHER_CHOICES = {
+    "GCM (authenticated + fast)": (".gcm", encrypt_file_gcm),
+    "CTR (fast, no authentication)": (".ctr", encrypt_file_ctr),
+    "CBC (openssl compatible)": (".enc", encrypt_file),
+}
+if HAVE_CRYPTOGRAPHY and operation == "Encrypt":
+    cipher_choice = st.sidebar.selectbox(
+        "Encryption cipher:", tuple(CIPHER_CHOICES),
+        help="GCM and CTR pipeline across AES-NI blocks (CBC encryption is "
+             "serial); only CBC output is decryptable by the openssl CLI."
+    )
+else:
+    cipher_choice = None
+
 uploaded_file = st.file_uploader("Choose a file or drag and drop", type=None) # Allow any type
 
 # Input Preview Area
@@ -141,10 +436,11 @@ default_output_filename = ""
 if uploaded_file:
     input_base, input_ext = os.path.splitext(uploaded_file.name)
     if operation == "Encrypt":
-        default_output_filename = f"{input_base}.enc"
+        suffix = CIPHER_CHOICES[cipher_choice][0] if cipher_choice else ".enc"
+        default_output_filename = f"{input_base}{suffix}"
     else: # Decrypt
-        # Try to intelligently remove .enc, otherwise add .dec
-        if input_ext.lower() == '.enc':
+        # Try to intelligently remove .gcm/.ctr/.enc, otherwise add .dec
+        if input_ext.lower() in ('.enc', '.gcm', '.ctr'):
             default_output_filename = input_base if input_base else "decrypted_file"
         else:
             default_output_filename = f"{uploaded_file.name}.dec" # Decrypt non-.enc file? Risky but possible.
@@ -164,36 +460,61 @@ download_placeholder = st.empty()
 
 # --- Logic Execution ---
 if run_button and uploaded_file:
-    # Reset previous results
-    st.session_state.output_content = None
-    st.session_state.output_filename = None
-    st.session_state.operation_status = None
-    status_placeholder.info(f"Processing {operation}...")
-    output_preview_placeholder.empty()
-    download_placeholder.empty()
-
-    # --- Input Validation ---
+    # --- Input Validation (before any state reset or file I/O, so a
+    # typo doesn't cost a multi-MB staging copy) ---
     if not password:
         status_placeholder.error("Password cannot be empty.")
         st.stop()
-    if operation == "Encrypt" and password != password_confirm:
+    if operation == "Encrypt" and not hmac.compare_digest(
+            password.encode(), password_confirm.encode()):
         status_placeholder.error("Passwords do not match.")
         st.stop()
     if not output_filename_user:
         status_placeholder.error("Output filename cannot be empty.")
         st.stop()
 
-    # --- File Handling & OpenSSL Execution ---
-    temp_dir = None # Initialize to ensure it's defined for finally block
-    try:
-        # Create a temporary directory to hold input and output files safely
-        temp_dir = tempfile.mkdtemp()
-        input_file_path = os.path.join(temp_dir, uploaded_file.name)
-        output_file_path = os.path.join(temp_dir, output_filename_user) # Use user-defined name directly
+    # Reset previous results
+    if st.session_state.output_path:
+        _remove_quietly(st.session_state.output_path)
+    st.session_state.output_path = None
+    st.session_state.output_preview = None
+    st.session_state.output_filename = None
+    st.session_state.operation_status = None
+    status_placeholder.info(f"Processing {operation}...")
+    output_preview_placeholder.empty()
+    download_placeholder.empty()
 
-        # Write uploaded content to the temporary input file
+    # --- File Handling & Execution ---
+    # Stage the input in the session workspace (truncated in place on
+    # reuse); the output goes to a persistent spill file so it can be
+    # streamed for download afterwards.
+    input_file_path = os.path.join(st.session_state.workdir, uploaded_file.name)
+    output_fd, output_file_path = tempfile.mkstemp(suffix=".out")
+    os.close(output_fd)
+    atexit.register(_remove_quietly, output_file_path)
+    try:
+        # Stream uploaded content to the temporary input file in 1 MiB
+        # chunks instead of materializing it with getvalue(), reporting
+        # progress (the upload cap is raised in .streamlit/config.toml,
+        # so staging can take a noticeable moment)
+        total_size = uploaded_file.size or 1
+        progress_bar = status_placeholder.progress(
+            0.0, text=f"Staging {uploaded_file.name}...")
         with open(input_file_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
+            # Reserve the full extent up front: one allocation instead of
+            # per-chunk extends, and no fragmentation on large stagings.
+            if hasattr(os, 'posix_fallocate') and uploaded_file.size:
+                try:
+                    os.posix_fallocate(f.fileno(), 0, uploaded_file.size)
+                except OSError:
+                    pass # best-effort (unsupported filesystems)
+            uploaded_file.seek(0)
+            bytes_written = 0
+            while chunk := uploaded_file.read(1024 * 1024):
+                f.write(chunk)
+                bytes_written += len(chunk)
+                progress_bar.progress(min(bytes_written / total_size, 1.0))
+        status_placeholder.info(f"Processing {operation}...")
 
         # Display input preview (now that the temp file exists)
         with input_preview_placeholder.expander("Preview Input File", expanded=False):
@@ -202,23 +523,49 @@ if run_button and uploaded_file:
              st.markdown(get_file_preview(input_file_path))
 
 
-        # Prepare OpenSSL arguments
-        args = ['enc', f'-{ENCRYPTION_CIPHER}', '-pbkdf2']
-        if operation == "Decrypt":
-            args.append('-d')
-        elif operation == "Encrypt":
-             args.append('-p') # Print salt/key/iv for encryption as per original spec
+        if HAVE_CRYPTOGRAPHY:
+            # In-process path: no subprocess. Encryption uses the selected
+            # cipher; decryption sniffs the header so GCM, CTR and
+            # openssl-CBC ciphertexts all keep working.
+            try:
+                if operation == "Encrypt":
+                    encrypt_fn = CIPHER_CHOICES[cipher_choice][1]
+                    encrypt_fn(input_file_path, output_file_path, password)
+                else:
+                    with open(input_file_path, 'rb') as fh:
+                        magic = fh.read(len(GCM_MAGIC))
+                    if magic == GCM_MAGIC:
+                        decrypt_file_gcm(input_file_path, output_file_path, password)
+                    elif magic == CTR_MAGIC:
+                        decrypt_file_ctr(input_file_path, output_file_path, password)
+                    else:
+                        decrypt_file(input_file_path, output_file_path, password)
+                success = True
+            except ValueError as e:
+                st.error(f"{operation} error: {e}")
+                success = False
+        else:
+            # Prepare OpenSSL arguments
+            args = ['enc', f'-{ENCRYPTION_CIPHER}', '-pbkdf2']
+            if operation == "Decrypt":
+                args.append('-d')
+            elif operation == "Encrypt":
+                 args.append('-p') # Print salt/key/iv for encryption as per original spec
 
-        args.extend(['-in', input_file_path, '-out', output_file_path])
+            args.extend(['-in', input_file_path, '-out', output_file_path])
 
-        # Run the command
-        success, stdout, stderr = run_openssl_command(args, password)
+            # Run the command
+            success, stdout, stderr = run_openssl_command(args, password)
 
         if success and os.path.exists(output_file_path):
             st.session_state.operation_status = "success"
-            # Read the output file content for download and preview
-            with open(output_file_path, "rb") as f:
-                st.session_state.output_content = f.read()
+            # Keep only the spill-file path; the download streams from it
+            st.session_state.output_path = output_file_path
+            # Render the preview once, straight after writing, while the
+            # head is still in the page cache; reruns reuse the string.
+            # Mime is guessed from the user-chosen name, not the spill path.
+            st.session_state.output_preview = get_file_preview(
+                output_file_path, display_name=output_filename_user)
             st.session_state.output_filename = output_filename_user # Store the intended filename
 
             status_placeholder.success(f"{operation} successful!")
@@ -226,16 +573,16 @@ if run_button and uploaded_file:
             # Display Output Preview
             with output_preview_placeholder.expander("Preview Output File", expanded=True):
                  st.write(f"**Filename:** `{st.session_state.output_filename}`")
-                 output_size = len(st.session_state.output_content)
+                 output_size = os.path.getsize(output_file_path)
                  st.write(f"**Size:** `{output_size / 1024:.2f} KB`")
-                 st.markdown(get_file_preview(output_file_path)) # Preview from temp file
+                 st.markdown(st.session_state.output_preview)
 
             # Add Download Button
             download_placeholder.download_button(
                 label=f"Download {st.session_state.output_filename}",
-                data=st.session_state.output_content,
+                data=open(output_file_path, 'rb'),
                 file_name=st.session_state.output_filename,
-                mime=mimetypes.guess_type(st.session_state.output_filename)[0] or 'application/octet-stream'
+                mime=guess_mime(st.session_state.output_filename)
             )
 
         else:
@@ -243,67 +590,60 @@ if run_button and uploaded_file:
             # Error message already displayed by run_openssl_command
             status_placeholder.error(f"{operation} failed. See details above.")
             # Clean up potentially incomplete output file
-            if os.path.exists(output_file_path):
-                try:
-                    os.remove(output_file_path)
-                except OSError:
-                    pass # Ignore cleanup error
+            _remove_quietly(output_file_path)
 
 
     except Exception as e:
         status_placeholder.error(f"An error occurred during processing: {e}")
         st.session_state.operation_status = "fail"
     finally:
-        # --- Cleanup ---
-        if temp_dir and os.path.exists(temp_dir):
-            try:
-                shutil.rmtree(temp_dir)
-                # st.write(f"DEBUG: Cleaned up temp directory: {temp_dir}") # For debugging
-            except Exception as e:
-                st.warning(f"Could not automatically clean up temporary directory {temp_dir}: {e}")
+        # --- Cleanup --- (drop the staged plaintext; the workspace
+        # directory itself is reused for the session)
+        _remove_quietly(input_file_path)
 
 # --- Display Input Preview if file uploaded but not processed yet ---
 # (Also persists after processing if successful)
 elif uploaded_file and st.session_state.operation_status != "fail": # Avoid showing preview if last op failed
-     temp_dir_preview = None
      try:
-        temp_dir_preview = tempfile.mkdtemp()
-        preview_input_path = os.path.join(temp_dir_preview, uploaded_file.name)
-        with open(preview_input_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
+        # Preview straight from the upload's buffer; cached on a cheap
+        # content-probe key so reruns (every keystroke) skip the work.
         with input_preview_placeholder.expander("Preview Input File", expanded=False):
              st.write(f"**Filename:** `{uploaded_file.name}`")
              st.write(f"**Size:** `{uploaded_file.size / 1024:.2f} KB`")
-             st.markdown(get_file_preview(preview_input_path))
+             st.markdown(cached_upload_preview(
+                 upload_preview_key(uploaded_file), uploaded_file))
      except Exception as e:
         input_preview_placeholder.warning(f"Could not generate input preview: {e}")
-     finally:
-        if temp_dir_preview:
-            shutil.rmtree(temp_dir_preview)
 
 # --- Display previous successful results if no new file is uploaded ---
-elif not uploaded_file and st.session_state.operation_status == "success" and st.session_state.output_content:
+elif (not uploaded_file and st.session_state.operation_status == "success"
+      and st.session_state.output_path
+      and os.path.exists(st.session_state.output_path)):
     status_placeholder.success("Showing previous successful result.")
     # Display Output Preview
     with output_preview_placeholder.expander("Preview Previous Output File", expanded=True):
          st.write(f"**Filename:** `{st.session_state.output_filename}`")
-         output_size = len(st.session_state.output_content)
+         output_size = os.path.getsize(st.session_state.output_path)
          st.write(f"**Size:** `{output_size / 1024:.2f} KB`")
-         # Can't easily re-preview from bytes, just show info
-         st.info("Preview requires reprocessing. Download the file to view full content.")
+         st.markdown(st.session_state.output_preview
+                     or get_file_preview(st.session_state.output_path,
+                                         display_name=st.session_state.output_filename))
 
     # Add Download Button
     download_placeholder.download_button(
         label=f"Download {st.session_state.output_filename}",
-        data=st.session_state.output_content,
+        data=open(st.session_state.output_path, 'rb'),
         file_name=st.session_state.output_filename,
-        mime=mimetypes.guess_type(st.session_state.output_filename)[0] or 'application/octet-stream'
+        mime=guess_mime(st.session_state.output_filename)
     )
 
 st.markdown("---")
 # Add a button to clear state if needed
 if st.button("Clear All"):
-    st.session_state.output_content = None
+    if st.session_state.output_path:
+        _remove_quietly(st.session_state.output_path)
+    st.session_state.output_path = None
+    st.session_state.output_preview = None
     st.session_state.output_filename = None
     st.session_state.operation_status = None
     # Force a rerun to clear widgets state indirectly (may need explicit clearing for some widgets if needed)
@@ -1,59 +1,190 @@
 # pages/2_Zip_File_Tool.py
 
 import streamlit as st
+import atexit
+import collections
+import hmac
+import selectors
 import subprocess
+import time
 import os
 import tempfile
 import shutil
 import mimetypes # To guess file types for download
 
+import tools_check
+
+# Preferred: create the archive in-process (no fork/exec, no temp files, and the
+# password never appears on a command line). Falls back to the system `zip`
+# binary only when pyzipper isn't installed.
+try:
+    import pyzipper
+except ImportError:
+    pyzipper = None
+
+# Optional: ISA-L's SIMD-accelerated deflate is a drop-in for zlib and
+# roughly doubles DEFLATED throughput; swap it into the zipfile machinery
+# when available. The output is standard DEFLATE either way.
+try:
+    from isal import isal_zlib
+    if pyzipper:
+        pyzipper.zipfile.zlib = isal_zlib
+except ImportError:
+    pass
+
 # --- Configuration ---
-ZIP_COMMAND = "zip"
+ZIP_COMMAND = "zip" # Fallback only, used when pyzipper is unavailable
+ZIP_TIMEOUT = 120 # Seconds before a fallback zip run is killed
+
+# Formats that are already entropy-coded: deflating them burns CPU for a
+# <1% size win, so store them as-is and keep DEFLATE for everything else.
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".7z", ".avif", ".bz2", ".gz", ".heic", ".jpeg", ".jpg", ".mkv",
+    ".mov", ".mp3", ".mp4", ".pdf", ".png", ".rar", ".webm", ".webp",
+    ".xz", ".zip", ".zst",
+}
 
 # --- Helper Functions ---
 
+def _remove_quietly(path):
+    """Best-effort removal of a spill file (used for atexit cleanup)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def unique_arcnames(uploaded_files):
+    """
+    Disambiguates duplicate upload names (the browser allows picking files
+    with the same name from different folders) the way browsers do:
+    'name.ext', 'name (1).ext', ...
+    """
+    seen = {}
+    names = []
+    for f in uploaded_files:
+        count = seen.get(f.name, 0)
+        seen[f.name] = count + 1
+        if count == 0:
+            names.append(f.name)
+        else:
+            base, ext = os.path.splitext(f.name)
+            names.append(f"{base} ({count}){ext}")
+    return names
+
+def create_zip_archive(uploaded_files, password):
+    """
+    Zips the uploaded files into an AES-encrypted archive in a spill file,
+    so the result never has to sit in Python memory. Returns the file path.
+    """
+    # 64 KiB buffering coalesces the deflate encoder's many small writes
+    # before they reach the file.
+    out = tempfile.NamedTemporaryFile(
+        suffix=".zip", delete=False, buffering=65536
+    )
+    atexit.register(_remove_quietly, out.name)
+    with out:
+        with pyzipper.AESZipFile(
+            out, 'w',
+            compression=pyzipper.ZIP_DEFLATED,
+            encryption=pyzipper.WZ_AES
+        ) as zf:
+            zf.setpassword(password.encode())
+            # WinZip AES-256 (AES-CTR + HMAC): the pycryptodome backend uses
+            # AES-NI when the CPU supports it, unlike legacy ZipCrypto.
+            zf.setencryption(pyzipper.WZ_AES, nbits=256)
+            arcnames = unique_arcnames(uploaded_files)
+            for uploaded_file, arcname in zip(uploaded_files, arcnames):
+                ext = os.path.splitext(uploaded_file.name)[1].lower()
+                # zipinfo_cls: AESZipFile insists on its own ZipInfo subclass
+                zinfo = zf.zipinfo_cls(
+                    arcname, date_time=time.localtime()[:6]
+                )
+                zinfo.compress_type = (
+                    pyzipper.ZIP_STORED if ext in INCOMPRESSIBLE_EXTENSIONS
+                    else pyzipper.ZIP_DEFLATED
+                )
+                zinfo.external_attr = 0o600 << 16 # rw for owner on extract
+                # Stream in 1 MiB chunks rather than materializing each
+                # upload with getvalue(); keeps peak memory flat.
+                uploaded_file.seek(0)
+                with zf.open(zinfo, 'w', force_zip64=True) as entry:
+                    shutil.copyfileobj(uploaded_file, entry, length=1024 * 1024)
+    return out.name
+
+@st.cache_data
+def default_output_name(input_name):
+    """Derives the suggested archive name for an upload; cached per name."""
+    input_base, _ = os.path.splitext(input_name)
+    return f"{input_base}_protected.zip"
+
 def check_zip_command():
-    """Checks if the zip command is available in the system PATH."""
-    if shutil.which(ZIP_COMMAND) is None:
-        st.error(f"CRITICAL ERROR: '{ZIP_COMMAND}' command not found. Please ensure the native zip utility is installed and in the system PATH.")
+    """Checks if the zip command is available in the system PATH (fallback path only)."""
+    if tools_check.which(ZIP_COMMAND) is None:
+        st.error(f"CRITICAL ERROR: Neither the 'pyzipper' package nor the '{ZIP_COMMAND}' command is available. Please install pyzipper (`pip install pyzipper`) or the native zip utility.")
         st.stop()
     return True
 
 def run_zip_command(args, password_for_masking):
     """
     Runs the zip command with given arguments.
-    Returns tuple: (success_boolean, stdout_str, stderr_str)
+    Returns tuple: (success_boolean, stdout_bytes, stderr_str); stdout is
+    always empty since it is discarded at the fd level.
     """
     command = [ZIP_COMMAND] + args
-    printable_command = []
-    password_found = False
-    for i, arg in enumerate(command):
-        if arg == '-P' and i + 1 < len(command):
-            printable_command.extend([arg, '********'])
-            password_found = True
-        elif password_found:
-            password_found = False
-            continue
-        else:
-            printable_command.append(arg)
+    if os.environ.get("ZIP_DEBUG"):
+        # Masked argv for troubleshooting only; skips the per-call walk
+        # in normal operation.
+        pwd_index = command.index('-P') + 1 if '-P' in command else -1
+        printable_command = ['********' if i == pwd_index else arg
+                             for i, arg in enumerate(command)]
+        st.write(f"DEBUG: Running command: `{' '.join(printable_command)}`")
 
     try:
-        process = subprocess.run(
-            command, check=False, capture_output=True, text=True, timeout=120
+        # stdin and stdout are closed off at the fd level (nothing is ever
+        # written to or read from them, and a prompting tool must not wait
+        # on input); stderr is drained under a hard deadline so a child
+        # that hangs with the pipe open can't wedge the worker.
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
         )
-        success = process.returncode == 0
+        stderr_tail = collections.deque(maxlen=64)
+        deadline = time.monotonic() + ZIP_TIMEOUT
+        try:
+            with process.stderr, selectors.DefaultSelector() as selector:
+                selector.register(process.stderr, selectors.EVENT_READ)
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(command, ZIP_TIMEOUT)
+                    if selector.select(remaining):
+                        data = os.read(process.stderr.fileno(), 65536)
+                        if not data:
+                            break
+                        stderr_tail.append(data)
+            returncode = process.wait(
+                timeout=max(deadline - time.monotonic(), 1.0))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise
+        success = returncode == 0
+        stderr_str = ""
         if not success:
-            err_lower = process.stderr.lower()
-            if "nothing to do" in err_lower:
-                 st.error(f"Zip Error (Exit Code {process.returncode}): Nothing to zip. Check input file path.\n```\n{process.stderr.strip()}\n```")
+            stderr_str = b''.join(stderr_tail).decode('utf-8', 'replace').strip()
+            if "nothing to do" in stderr_str.lower():
+                 st.error(f"Zip Error (Exit Code {returncode}): Nothing to zip. Check input file path.\n```\n{stderr_str}\n```")
             else:
-                 st.error(f"Zip Error (Exit Code {process.returncode}):\n```\n{process.stderr.strip()}\n```")
-        elif process.stderr:
-             st.info(f"Zip Messages (stderr):\n```\n{process.stderr.strip()}\n```")
-        return success, process.stdout.strip(), process.stderr.strip()
+                 st.error(f"Zip Error (Exit Code {returncode}):\n```\n{stderr_str}\n```")
+        elif stderr_tail:
+             stderr_str = b''.join(stderr_tail).decode('utf-8', 'replace').strip()
+             st.info(f"Zip Messages (stderr):\n```\n{stderr_str}\n```")
+        return success, b"", stderr_str
     except subprocess.TimeoutExpired:
-        st.error("Zip command timed out after 120 seconds.")
-        return False, "", "Timeout expired"
+        st.error(f"Zip command timed out after {ZIP_TIMEOUT} seconds.")
+        return False, b"", "Timeout expired"
     except FileNotFoundError:
          st.error(f"Error: The '{ZIP_COMMAND}' command was not found. Is it installed and in PATH?")
          return False, "", f"Command not found: {ZIP_COMMAND}"
@@ -69,14 +200,16 @@ st.set_page_config(
 )
 
 st.title("📦 Create Password-Protected ZIP File")
-st.markdown("Uses the system's `zip` command with password protection.")
-
-check_zip_command()
+if pyzipper:
+    st.markdown("Creates AES-encrypted ZIP archives in-process (no external `zip` command needed).")
+else:
+    st.markdown("Uses the system's `zip` command with password protection.")
+    check_zip_command()
 
 # --- Session State Initialization ---
-# For storing results
-if 'output_zip_content' not in st.session_state:
-    st.session_state.output_zip_content = None
+# For storing results (path of the spill file, not the archive bytes)
+if 'output_zip_path' not in st.session_state:
+    st.session_state.output_zip_path = None
 if 'output_zip_filename' not in st.session_state:
     st.session_state.output_zip_filename = None
 if 'zip_operation_status' not in st.session_state:
@@ -87,57 +220,60 @@ if 'zip_clear_trigger' not in st.session_state:
     st.session_state.zip_clear_trigger = 0 # Initialize clear trigger
 
 # --- UI Elements ---
-st.info("**Note:** This tool currently supports zipping a single file.", icon="ℹ️")
+st.info("**Note:** Multiple files are bundled into a single archive.", icon="ℹ️")
 
-# Use the clear trigger in the key to force reset when trigger changes
+# Batch the uploader, passwords and filename into one submit event: the
+# script then reruns once per click instead of once per keystroke.
+# Use the clear trigger in the keys to force reset when trigger changes
 uploader_key = f"zip_uploader_{st.session_state.zip_clear_trigger}"
-uploaded_file = st.file_uploader(
-    "Choose the file to zip",
-    type=None,
-    key=uploader_key
-)
-
-st.markdown("### Set ZIP Password")
-col1, col2 = st.columns(2)
-# Use the clear trigger in the keys
 pwd1_key = f"zip_pwd1_{st.session_state.zip_clear_trigger}"
 pwd2_key = f"zip_pwd2_{st.session_state.zip_clear_trigger}"
-with col1:
-    password = st.text_input("Enter Password:", type="password", key=pwd1_key)
-with col2:
-    password_confirm = st.text_input("Confirm Password:", type="password", key=pwd2_key)
-
-# Output Filename Suggestion/Input
-default_output_filename = ""
-if uploaded_file:
-    input_base, _ = os.path.splitext(uploaded_file.name)
-    default_output_filename = f"{input_base}_protected.zip"
-
-# Use the clear trigger in the key
 output_name_key = f"zip_output_name_{st.session_state.zip_clear_trigger}"
-output_filename_user = st.text_input(
-    "Desired Output ZIP Filename:",
-    value=default_output_filename, # Default value will reappear after clear
-    placeholder="e.g., protected_archive.zip",
-    key=output_name_key
-)
 
-# Action Button and Status Area
-st.markdown("---")
-st.warning("""
-    **Security Note:** For automation, this tool passes the password directly to the `zip` command using the `-P` flag.
-    This means the password might be temporarily visible in your system's process list.
-    This is less secure than interactive password prompts used in the terminal. Use with caution in shared environments.
-""", icon="⚠️")
+with st.form("zip_form"):
+    uploaded_files = st.file_uploader(
+        "Choose the file(s) to zip",
+        type=None,
+        accept_multiple_files=True,
+        key=uploader_key
+    )
+
+    st.markdown("### Set ZIP Password")
+    col1, col2 = st.columns(2)
+    with col1:
+        password = st.text_input("Enter Password:", type="password", key=pwd1_key)
+    with col2:
+        password_confirm = st.text_input("Confirm Password:", type="password", key=pwd2_key)
+
+    # No rerun happens between upload and submit inside a form, so the
+    # default name is derived at submit time when this is left empty.
+    output_filename_user = st.text_input(
+        "Desired Output ZIP Filename:",
+        placeholder="Defaults to <input name>_protected.zip",
+        key=output_name_key
+    )
+
+    if not pyzipper:
+        st.warning("""
+            **Security Note:** For automation, this tool passes the password directly to the `zip` command using the `-P` flag.
+            This means the password might be temporarily visible in your system's process list.
+            This is less secure than interactive password prompts used in the terminal. Use with caution in shared environments.
+        """, icon="⚠️")
+
+    run_button = st.form_submit_button("Create Protected ZIP", type="primary")
 
-run_button = st.button("Create Protected ZIP", type="primary", disabled=not uploaded_file)
+st.markdown("---")
 status_placeholder = st.empty()
 download_placeholder = st.empty()
 
 # --- Logic Execution ---
-if run_button and uploaded_file:
+if run_button and not uploaded_files:
+    status_placeholder.error("Please choose at least one file to zip.")
+elif run_button and uploaded_files:
     # Reset previous results before processing
-    st.session_state.output_zip_content = None
+    if st.session_state.output_zip_path:
+        _remove_quietly(st.session_state.output_zip_path)
+    st.session_state.output_zip_path = None
     st.session_state.output_zip_filename = None
     st.session_state.zip_operation_status = None
     status_placeholder.info("Processing...")
@@ -147,13 +283,12 @@ if run_button and uploaded_file:
     if not password:
         status_placeholder.error("Password cannot be empty.")
         st.stop()
-    if password != password_confirm:
+    if not hmac.compare_digest(password.encode(), password_confirm.encode()):
         status_placeholder.error("Passwords do not match.")
         st.stop()
     if not output_filename_user:
-        status_placeholder.error("Output ZIP filename cannot be empty.")
-        st.stop()
-    if not output_filename_user.lower().endswith('.zip'):
+        actual_output_filename = default_output_name(uploaded_files[0].name)
+    elif not output_filename_user.lower().endswith('.zip'):
         # Modify the value directly in the widget state before using it
         # This is less clean, perhaps just use the modified name later
         actual_output_filename = output_filename_user + ".zip"
@@ -162,59 +297,102 @@ if run_button and uploaded_file:
         actual_output_filename = output_filename_user
 
 
-    temp_dir = None
-    try:
-        temp_dir = tempfile.mkdtemp()
-        input_file_path = os.path.join(temp_dir, uploaded_file.name)
-        # Use the potentially modified filename
-        output_file_path = os.path.join(temp_dir, actual_output_filename)
-
-        with open(input_file_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
-
-        args = [
-            '-j', '-e', '-P', password,
-            output_file_path, input_file_path
-        ]
-
-        success, stdout, stderr = run_zip_command(args, password)
-
-        if success and os.path.exists(output_file_path):
+    if pyzipper:
+        # In-process path: no subprocess, archive streamed into a spill file.
+        try:
+            zip_path = create_zip_archive(uploaded_files, password)
             st.session_state.zip_operation_status = "success"
-            with open(output_file_path, "rb") as f:
-                st.session_state.output_zip_content = f.read()
-            # Store the actual filename used
+            st.session_state.output_zip_path = zip_path
             st.session_state.output_zip_filename = actual_output_filename
 
             status_placeholder.success("Password-protected ZIP created successfully!")
             download_placeholder.download_button(
                 label=f"Download {st.session_state.output_zip_filename}",
-                data=st.session_state.output_zip_content,
+                data=open(zip_path, 'rb'),
                 file_name=st.session_state.output_zip_filename,
                 mime='application/zip'
             )
-        else:
+        except Exception as e:
+            status_placeholder.error(f"An error occurred during ZIP processing: {e}")
+            st.session_state.zip_operation_status = "fail"
+    else:
+        # Fallback path: shell out to the system `zip` binary via temp files.
+        # zip(1) cannot stream a single named entry stdin->stdout, so staging
+        # through a temp file is unavoidable here; the pyzipper path above is
+        # the no-copy route. Prefer tmpfs (/dev/shm) so the intermediates
+        # never touch disk.
+        tmp_root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        try:
+            with tempfile.TemporaryDirectory(dir=tmp_root) as temp_dir:
+                # Use the potentially modified filename
+                output_file_path = os.path.join(temp_dir, actual_output_filename)
+
+                input_file_paths = []
+                arcnames = unique_arcnames(uploaded_files)
+                for uploaded_file, arcname in zip(uploaded_files, arcnames):
+                    input_file_path = os.path.join(temp_dir, arcname)
+                    # Write straight from the upload's buffer with os.write,
+                    # skipping Python's buffered-IO layer and its extra copies.
+                    fd = os.open(input_file_path,
+                                 os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                    try:
+                        mv = uploaded_file.getbuffer()
+                        offset = 0
+                        while offset < len(mv):
+                            offset += os.write(fd, mv[offset:offset + (1 << 20)])
+                    finally:
+                        os.close(fd)
+                    input_file_paths.append(input_file_path)
+
+                args = [
+                    '-j', '-e', '-P', password,
+                    output_file_path
+                ] + input_file_paths
+                # Same compression skip for the CLI: -0 stores without
+                # deflating (only when every input is already compressed,
+                # since the flag applies archive-wide).
+                if all(os.path.splitext(f.name)[1].lower() in INCOMPRESSIBLE_EXTENSIONS
+                       for f in uploaded_files):
+                    args.insert(0, '-0')
+
+                success, stdout, stderr = run_zip_command(args, password)
+
+                if success and os.path.exists(output_file_path):
+                    st.session_state.zip_operation_status = "success"
+                    # Move the archive out of the temp dir so it can still be
+                    # streamed for download after the dir is torn down.
+                    persist_fd, persist_path = tempfile.mkstemp(suffix=".zip")
+                    os.close(persist_fd)
+                    shutil.move(output_file_path, persist_path)
+                    atexit.register(_remove_quietly, persist_path)
+                    st.session_state.output_zip_path = persist_path
+                    # Store the actual filename used
+                    st.session_state.output_zip_filename = actual_output_filename
+
+                    status_placeholder.success("Password-protected ZIP created successfully!")
+                    download_placeholder.download_button(
+                        label=f"Download {st.session_state.output_zip_filename}",
+                        data=open(persist_path, 'rb'),
+                        file_name=st.session_state.output_zip_filename,
+                        mime='application/zip'
+                    )
+                else:
+                    st.session_state.zip_operation_status = "fail"
+                    status_placeholder.error("Failed to create ZIP file. See details above.")
+
+        except Exception as e:
+            status_placeholder.error(f"An error occurred during ZIP processing: {e}")
             st.session_state.zip_operation_status = "fail"
-            status_placeholder.error("Failed to create ZIP file. See details above.")
-            if os.path.exists(output_file_path):
-                try: os.remove(output_file_path)
-                except OSError: pass
-
-    except Exception as e:
-        status_placeholder.error(f"An error occurred during ZIP processing: {e}")
-        st.session_state.zip_operation_status = "fail"
-    finally:
-        if temp_dir and os.path.exists(temp_dir):
-            try: shutil.rmtree(temp_dir)
-            except Exception as e: st.warning(f"Could not clean up temp dir {temp_dir}: {e}")
 
 # --- Display previous successful results ---
 # (This logic remains the same)
-elif not uploaded_file and st.session_state.zip_operation_status == "success" and st.session_state.output_zip_content:
+elif (not uploaded_files and st.session_state.zip_operation_status == "success"
+      and st.session_state.output_zip_path
+      and os.path.exists(st.session_state.output_zip_path)):
     status_placeholder.success("Showing previous successful result.")
     download_placeholder.download_button(
         label=f"Download {st.session_state.output_zip_filename}",
-        data=st.session_state.output_zip_content,
+        data=open(st.session_state.output_zip_path, 'rb'),
         file_name=st.session_state.output_zip_filename,
         mime='application/zip'
     )
@@ -224,8 +402,10 @@ st.markdown("---")
 # --- Clear All Button ---
 # Changed label to "Clear All"
 if st.button("Clear All"):
-    # Reset results
-    st.session_state.output_zip_content = None
+    # Reset results and drop the spill file
+    if st.session_state.output_zip_path:
+        _remove_quietly(st.session_state.output_zip_path)
+    st.session_state.output_zip_path = None
     st.session_state.output_zip_filename = None
     st.session_state.zip_operation_status = None
     # Increment the trigger to change widget keys
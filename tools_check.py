@@ -0,0 +1,40 @@
+# tools_check.py (Shared command lookups)
+
+"""Shared, memoized lookups for the command-line tools the app shells out to."""
+
+import functools
+import os
+import shutil
+
+REQUIRED_COMMANDS = ("openssl", "zip")
+
+@functools.lru_cache(maxsize=None)
+def locate_tools():
+    """
+    Scans PATH once, collecting every required executable in a single pass.
+    Memoized so Streamlit reruns (and every page) share one directory walk.
+    """
+    found = {}
+    for path_dir in os.environ.get("PATH", "").split(os.pathsep):
+        try:
+            names = set(os.listdir(path_dir))
+        except OSError:
+            continue
+        for tool in REQUIRED_COMMANDS:
+            for candidate in (tool, tool + ".exe"):
+                if candidate in names:
+                    full_path = os.path.join(path_dir, candidate)
+                    if os.access(full_path, os.X_OK):
+                        found.setdefault(tool, full_path)
+    return found
+
+@functools.lru_cache(maxsize=None)
+def which(cmd):
+    """Returns the full path of a command, or None if absent."""
+    if cmd in REQUIRED_COMMANDS:
+        return locate_tools().get(cmd)
+    return shutil.which(cmd)
+
+def missing(required=REQUIRED_COMMANDS):
+    """Returns the subset of required commands not found on PATH."""
+    return [cmd for cmd in required if which(cmd) is None]